@@ -1,8 +1,12 @@
 import yaml
 
+# Prefer the libyaml C bindings, fall back to the pure-Python implementation.
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+Dumper = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 from hamstercage.manifest import Manifest, FileMode
 
-__all__ = ["Manifest"]
+__all__ = ["Dumper", "Loader", "Manifest"]
 
 
 def representer(dumper, data):
@@ -10,3 +14,4 @@ def representer(dumper, data):
 
 
 yaml.add_representer(FileMode, representer)
+Dumper.add_representer(FileMode, representer)
@@ -1,35 +1,45 @@
 import argparse
+import functools
 import os
-import shutil
+import re
 import socket
-from datetime import datetime
-from difflib import unified_diff
+import stat
+import time
 from pathlib import Path
 from typing import Iterator, Union
 
 import sys
-from yaml.scanner import ScannerError
+from yaml import YAMLError
 
 from hamstercage import Manifest
 from hamstercage.hamstercage_exception import HamstercageException
 from hamstercage.manifest import Host, Tag, Entry, DirEntry, SymlinkEntry, FileEntry
 from hamstercage.utils import (
-    chmod,
     ensure_last_line_ends_in_newline,
+    files_differ,
+    glob_to_regex,
     mode_to_str,
     short_date,
+    stat_or_none,
     print_table,
     ListEntry,
-    path_as_child_of,
 )
 
 
+@functools.lru_cache(maxsize=None)
+def _default_hostname() -> str:
+    """
+    Return the name of this host. The lookup is done only once per process.
+    :return: hostname
+    """
+    return socket.gethostname()
+
+
 class Hamstercage:
     """
     The main progam. Parses command line arguments and invokes sub-commands.
     """
 
-    target: Path
     manifest_file: Path
     files: list
     hostname: str
@@ -38,141 +48,39 @@ class Hamstercage:
 
     def __init__(self):
         self.files = []
-        self.hostname = socket.gethostname()
+        self._file_set = set()
+        self._file_patterns = None
+        self.hostname = _default_hostname()
         self.manifest = None
         self.manifest_file = Path("hamstercage.yaml")
         self.repo = Path(".")
         self.tags = []
         self.target = Path("/")
 
+    @property
+    def target(self) -> Path:
+        """
+        The base directory of the target files.
+        """
+        return self._target
+
+    @target.setter
+    def target(self, target: Path) -> None:
+        self._target = target
+        # prefix of absolute paths below the target, always ending in exactly one slash
+        self._starget = os.fspath(target).rstrip("/") + "/"
+
     def main(self, args=None):
         if args is None:
             args = sys.argv[1:]
-        parser = argparse.ArgumentParser(
-            prog="hamstercage", description="Manage the hamster cage."
-        )
-        parser.add_argument(
-            "-d",
-            "--directory",
-            type=Path,
-            default="/",
-            help="base directory of target files",
-        )
-        parser.add_argument(
-            "-f",
-            "--file",
-            type=Path,
-            default="hamstercage.yaml",
-            help="manifest file to use",
-        )
-        parser.add_argument(
-            "-n", "--hostname", default=socket.gethostname(), help="name of this host"
-        )
-        parser.add_argument(
-            "-r", "--repo", type=Path, default=".", help="directory of file repo"
-        )
-        parser.add_argument("-t", "--tag", type=str, help="tags to apply/save")
-        parser.add_argument(
-            "-v", "--verbose", action="count", default=0, help="verbose output"
-        )
-        parser.set_defaults(func=None)
-
-        subparsers = parser.add_subparsers(help="sub-command help")
-
-        subparser = subparsers.add_parser(
-            "add", help="add one or more files to the manifest"
-        )
-        subparser.set_defaults(func=self.add)
-        subparser.add_argument(
-            "-f",
-            "--force",
-            action="count",
-            default=0,
-            help="overwrite existing entries",
-        )
-        subparser.add_argument("tag", help="tag to add files to")
-        subparser.add_argument("files", nargs="+", help="files to add")
-
-        subparser = subparsers.add_parser(
-            "apply", help="apply files from repo to target"
-        )
-        subparser.set_defaults(func=self.apply)
-        subparser.add_argument(
-            "files", nargs="*", help="limit results to these file patterns"
-        )
-
-        subparser = subparsers.add_parser(
-            "diff", help="print differences between target and repo"
-        )
-        subparser.set_defaults(func=self.diff)
-        subparser.add_argument(
-            "files", nargs="*", help="limit results to these file patterns"
-        )
-
-        subparser = subparsers.add_parser("init", help="create a new manifest")
-        subparser.set_defaults(func=self.init)
-
-        subparser = subparsers.add_parser(
-            "list", aliases=["ls"], help="list manifest entries"
-        )
-        subparser.set_defaults(func=self.list)
-        subparser.add_argument(
-            "-l", "--long", action="count", default=0, help="list format long"
-        )
-        subparser.add_argument(
-            "-t",
-            "--tabs",
-            action="count",
-            default=0,
-            help="separate columns with tabs instead of spaces",
-        )
-        subparser.add_argument(
-            "files", nargs="*", help="limit results to these file patterns"
-        )
-
-        subparser = subparsers.add_parser(
-            "remove",
-            aliases=["del", "rm"],
-            help="remove one or more files from the manifest",
-        )
-        subparser.set_defaults(func=self.remove)
-        subparser.add_argument("tag", help="tag to add files to")
-        subparser.add_argument("files", nargs="+", help="files to remove")
-
-        subparser = subparsers.add_parser("save", help="save target files to repo")
-        subparser.set_defaults(func=self.save)
-        subparser.add_argument(
-            "files", nargs="*", help="limit results to these file patterns"
-        )
-
-        subparser = subparsers.add_parser(
-            "tag",
-            help="manage tags in the manifest",
-        )
-        subparser.set_defaults(func=None)
-
-        tagparsers = subparser.add_subparsers(help="tag command help")
-
-        subparser = tagparsers.add_parser(
-            "add",
-            help="add a tag to the manifest",
-        )
-        subparser.set_defaults(func=self.tag_add)
-        subparser.add_argument("name", help="tag name")
-        subparser.add_argument(
-            "-d",
-            "--description",
-            type=str,
-            default="",
-            help="description for this tag",
-        )
-
+        parser = self._parser()
         args = parser.parse_args(args)
 
         if args.func:
             self.target = args.directory
             self.manifest_file = args.file
-            self.hostname = args.hostname
+            if args.hostname:
+                self.hostname = args.hostname
             self.repo = args.repo
             if args.tag:
                 self.tags = [args.tag]
@@ -195,10 +103,12 @@ class Hamstercage:
         if len(args.files) < 1:
             raise HamstercageException(f"Need at least one file to add", 64)
 
+        # repo directories created or found by this add
+        repo_dirs = set()
         self._run_hook(args.tag, "add", "pre")
         for file in args.files:
             entry = self._add_entry(args.tag, file, ignore_existing=args.force > 0)
-            self._save_entry(args.tag, entry)
+            self._save_entry(args.tag, entry, repo_dirs)
         self._run_hook(args.tag, "add", "post")
         self.manifest.dump()
         return 0
@@ -209,33 +119,35 @@ class Hamstercage:
         :return:
         """
         self._load_manifest()
+        self._select_files(args.files)
+        # target directories created or found by this apply
+        target_dirs = set()
         self._run_hooks("apply", "pre")
-        for t, e in self._entries():
-            e.apply(self._path_repo_entry(t, e), self._path_target(e))
+        for t, e, repo, target in self._resolved_entries():
+            e.apply(repo, target, target_dirs)
         self._run_hooks("apply", "post")
         return 0
 
     def diff(self, args):
         self._load_manifest()
         has_diff = False
-        self.files = args.files
+        self._select_files(args.files)
 
         self._run_hooks("diff", "pre")
-        for t, e in self._entries():
-            repo = self._path_repo_entry(t, e)
-            target = self._path_target(e)
-            if not repo.is_file():
+        for t, e, repo, target in self._resolved_entries():
+            repo_st = stat_or_none(repo)
+            if repo_st is None or not stat.S_ISREG(repo_st.st_mode):
                 continue  # non-files don't have a file under tags
-            if target.exists() and repo.exists():
-                diff = list(self._diff(target, repo))
+            target_st = stat_or_none(target)
+            if target_st is not None:
+                diff = list(self._diff(target, repo, target_st, repo_st))
                 sys.stdout.writelines(diff)
                 if diff:
                     has_diff = True
             else:
-                if self._mtime_or_missing(repo, "---"):
-                    has_diff = True
-                if self._mtime_or_missing(target, "+++"):
-                    has_diff = True
+                print(f"--- {str(repo)}\t{self._mtime(repo, repo_st)}")
+                print(f"+++ {str(target)}\tmissing")
+                has_diff = True
         self._run_hooks("diff", "post")
         return 1 if has_diff else 0
 
@@ -265,72 +177,17 @@ class Hamstercage:
         :return:
         """
         self._load_manifest()
-        self.files = args.files
+        self._select_files(args.files)
         items = {}
-        for t, e in self._entries():
-            repo = self._path_repo_entry(t, e)
-            target = self._path_target(e)
+        for t, e, repo, target in self._resolved_entries():
             if target not in items:
-                items[target] = ListEntry(e, repo, t)
+                items[target] = ListEntry(e, repo, t, target)
         if args.long == 0:
-            for path in sorted(items):
-                print(path)
+            sys.stdout.write("".join(f"{path}\n" for path in sorted(items)))
         else:
-            lines = []
-            for path in sorted(items):
-                item = items[path]
-                entry = item.entry
-                mtime = "?"
-                name = str(path)
-                size = "0"
-                status = " "
-                type = "-"
-                if path.exists():
-                    stat = path.stat()
-                    mtime = short_date(int(stat.st_mtime))
-                    if path.is_file():
-                        size = str(stat.st_size)
-                else:
-                    status = "!"
-                if isinstance(entry, FileEntry):
-                    if path.exists() and list(self._diff(path, item.repo)):
-                        status = "*"
-                elif isinstance(entry, DirEntry):
-                    name = name + "/"
-                    type = "d"
-                elif isinstance(entry, SymlinkEntry):
-                    name = name + " -> " + entry.target
-                    type = "l"
-                    if path.exists() and path.is_file():
-                        status = "!"
-                    elif path.exists() and os.readlink(path) != entry.target:
-                        status = "*"
-                lines.append(
-                    [
-                        status,
-                        mode_to_str(type, entry.mode),
-                        entry.owner,
-                        entry.group,
-                        size,
-                        mtime,
-                        item.tag,
-                        name,
-                    ]
-                )
+            now = time.time()
+            lines = [self._list_row(item, now) for _, item in sorted(items.items())]
             print_table(lines, align=["<", "<", "<", "<", ">"])
-        # widths = [0] * 8
-        # align = ["<", "<", "<", "<", ">", "<", "<", "<"]
-        # for line in lines:
-        #     for i in range(0, len(line)):
-        #         widths[i] = max(widths[i], len(line[i]))
-        # fs = []
-        # for i in range(0, len(widths) - 1):
-        #     fs.append(f"{{{i}:{align[i]}{widths[i]}}}")
-        #     # f = f + f"{{0:{widths[i]}.{widths[i]}s}}"
-        # fs.append(f"{{{len(widths)-1}}}")
-        # for line in lines:
-        #     # print("{0:} {1:}".format(*line), file=out)
-        #     print(" ".join(fs).format(*line), file=out)
         return 0
 
     def remove(self, args):
@@ -365,9 +222,12 @@ class Hamstercage:
         :return:
         """
         self._load_manifest()
+        self._select_files(args.files)
+        # repo directories created or found by this save
+        repo_dirs = set()
         self._run_hooks("save", "pre")
-        for tag, entry in self._entries():
-            self._save_entry(tag, entry)
+        for tag, entry, repo, target in self._resolved_entries():
+            entry.save(repo, target, self.manifest, repo_dirs)
         self._run_hooks("save", "post")
         return 0
 
@@ -407,27 +267,43 @@ class Hamstercage:
         entries[repo_path] = entry
         return entry
 
-    def _save_entry(self, tag: str, entry: Entry):
-        (repo_path, target_path) = self._normalize_target_path(entry.path)
-        entry.save(self._path_repo_path_tag(repo_path, tag), target_path, self.manifest)
+    def _save_entry(self, tag: str, entry: Entry, repo_dirs: set = None):
+        entry.save(
+            self._path_repo_entry(tag, entry),
+            self._path_target(entry),
+            self.manifest,
+            repo_dirs,
+        )
         return entry
 
     @staticmethod
-    def _diff(target, repo) -> Iterator[str]:
+    def _diff(
+        target, repo, target_st: os.stat_result = None, repo_st: os.stat_result = None
+    ) -> Iterator[str]:
         """
         Generate a unified diff between the target and the repo file.
 
         :param target: the target file path
         :param repo: the repo file path
+        :param target_st: result of stat() for target, if the caller already has it
+        :param repo_st: result of stat() for repo, if the caller already has it
         :return: An iterator of diff lines
         """
-        if not target.exists() or not repo.exists():
+        from difflib import unified_diff
+
+        if target_st is None:
+            target_st = stat_or_none(target)
+        if repo_st is None:
+            repo_st = stat_or_none(repo)
+        if target_st is None or repo_st is None:
             r = []
-            if not target.exists():
+            if target_st is None:
                 r.append(f"! {target} not found")
-            if not repo.exists():
+            if repo_st is None:
                 r.append(f"! {repo} not found")
             return r
+        if not files_differ(target, repo, target_st, repo_st, quick=True):
+            return []
         try:
             with open(target) as f:
                 t = f.readlines()
@@ -441,9 +317,9 @@ class Hamstercage:
             r,
             t,
             fromfile=str(repo),
-            fromfiledate=Hamstercage._mtime(repo),
+            fromfiledate=Hamstercage._mtime(repo, repo_st),
             tofile=str(target),
-            tofiledate=Hamstercage._mtime(target),
+            tofiledate=Hamstercage._mtime(target, target_st),
         )
 
     def _entries(self):
@@ -452,15 +328,23 @@ class Hamstercage:
         returns entries for the first match for a path.
         :return: (tag, entry)
         """
-        paths = {}
+        for t, e, _, _ in self._resolved_entries():
+            yield t, e
+
+    def _resolved_entries(self):
+        """
+        Like _entries(), but also produces the paths of the entry in the repo and in the target. The repo directory of
+        each tag is computed only once.
+        :return: (tag, entry, repo path, target path)
+        """
+        paths = set()
         for t in self.tags:
+            tag_repo = self._path_repo_tag(t)
             for p, e in self.manifest.tags[t].entries.items():
-                if not self._files_match(e):
-                    continue
-                if p in paths:
+                if p in paths or not self._files_match(e):
                     continue
-                paths[p] = True
-                yield t, e
+                paths.add(p)
+                yield t, e, e.path_as_child_of(tag_repo), self._path_target(e)
 
     @staticmethod
     def _exists_status(path) -> str:
@@ -479,76 +363,115 @@ class Hamstercage:
         :param entry: to check
         :return: True if the list of files matches this entry
         """
-        if len(self.files) == 0:
+        if not self.files or entry.path in self._file_set:
             return True
-        for file in self.files:
-            (repo_path, target_path) = self._normalize_target_path(file)
-            if entry.path == repo_path:
-                return True
-        return False
+        return self._file_patterns is not None and bool(
+            self._file_patterns.fullmatch(entry.path)
+        )
+
+    @staticmethod
+    def _list_row(item: ListEntry, now: float) -> tuple:
+        """
+        Return the columns of the long listing for one entry.
+        :param item: the entry to list
+        :param now: current epoch time, for the short date
+        :return: tuple of status, mode, owner, group, size, mtime, tag and name
+        """
+        entry = item.entry
+        path = item.target
+        mtime = "?"
+        name = str(path)
+        size = "0"
+        status = " "
+        type = "-"
+        try:
+            st = os.lstat(path)
+            mtime = short_date(int(st.st_mtime), now)
+            if stat.S_ISREG(st.st_mode):
+                size = str(st.st_size)
+        except FileNotFoundError:
+            st = None
+            status = "!"
+        if isinstance(entry, FileEntry):
+            # a symlink in place of the file is compared by following it
+            reg = st and stat.S_ISREG(st.st_mode)
+            if st and files_differ(path, item.repo, st if reg else None, quick=True):
+                status = "*"
+        elif isinstance(entry, DirEntry):
+            name = name + "/"
+            type = "d"
+        elif isinstance(entry, SymlinkEntry):
+            name = name + " -> " + entry.target
+            type = "l"
+            if st and not stat.S_ISLNK(st.st_mode):
+                status = "!"
+            elif st and os.readlink(path) != entry.target:
+                status = "*"
+        return (
+            status,
+            mode_to_str(type, entry.mode),
+            entry.owner,
+            entry.group,
+            size,
+            mtime,
+            item.tag,
+            name,
+        )
 
     def _load_manifest(self) -> None:
         """
         Load the manifest from the configured path. If the manifest had been loaded previously, do nothing.
         :return: None
         """
-        if self.manifest:
+        if self.manifest is not None:
             return
+        manifest_file = str(self.manifest_file)
         try:
-            self.manifest = Manifest(str(self.manifest_file))
-            self.manifest.load()
-            if len(self.tags) == 0:
-                if self.hostname in self.manifest.hosts:
-                    self.tags = self.manifest.hosts[self.hostname].tags
-                else:
-                    print(
-                        f"Warning: No hostname entry for {self.hostname}",
-                        file=sys.stderr,
-                    )
-        except FileNotFoundError as e:
-            raise HamstercageException(
-                f'Unable to load manifest from "{self.manifest_file}": {e}', 71
-            )
-        except ScannerError as e:
+            manifest = Manifest(manifest_file)
+            manifest.load()
+        except (FileNotFoundError, YAMLError) as e:
             raise HamstercageException(
-                f'Unable to load manifest from "{self.manifest_file}": {e}', 71
+                f'Unable to load manifest from "{manifest_file}": {e}', 71
             )
-
-    def _mkdir_repo(self, path: Path) -> None:
-        """
-        Create a directory in the repo, copying owner/group/mode from the manifest file
-        :param path: of the new directory
-        :return: None
-        """
-        if str(path) != ".":
-            self._mkdir_repo(path.parent)
-        p = self.repo.joinpath(path)
-        if not p.exists():
-            p.mkdir(mode=self.manifest.dir_mode)
-            chmod(str(p), self.manifest.dir_mode)
-            shutil.chown(str(p), self.manifest.owner, self.manifest.group)
+        self.manifest = manifest
+        if len(self.tags) == 0:
+            if self.hostname in self.manifest.hosts:
+                self.tags = self.manifest.hosts[self.hostname].tags
+            else:
+                print(
+                    f"Warning: No hostname entry for {self.hostname}",
+                    file=sys.stderr,
+                )
 
     @staticmethod
-    def _mtime(path: Path) -> str:
+    def _mtime(path: Path, st: os.stat_result = None) -> str:
         """
         Return the modification time of path as a string.
         :param path: of file
+        :param st: result of stat() for path, if the caller already has it
         :return: time and date in ISO8601 format
         """
-        return datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+        if st is None:
+            st = path.stat()
+        sec, ns = divmod(st.st_mtime_ns, 1_000_000_000)
+        mtime = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec))
+        if ns >= 1000:
+            mtime += f".{ns // 1000:06d}"
+        return mtime
 
-    def _mtime_or_missing(self, path: Path, prefix: str):
+    def _manifest_path(self, path: Union[str, Path]) -> str:
         """
-        Print the modification date of path, or "missing" if the file doesn't exist.
-        :param path: of the file
-        :param prefix: string prefix to print
-        :return:
+        Returns the path as it should be entered into the manifest.
+        :param path: absolute path including the target directory, or path relative to the target directory
+        :return: manifest path
         """
-        if path.exists():
-            print(f"{prefix} {str(path)}\t{self._mtime(path)}")
-            return False
-        print(f"{prefix} {str(path)}\tmissing")
-        return True
+        path = os.fspath(path)
+        if path.startswith(self._starget):
+            # path including target, strip target
+            return path[len(self._starget) - 1 :]
+        if path.startswith("/"):
+            return path
+        return "/" + path
 
     def _normalize_target_path(self, path: Union[str, Path]) -> (str, Path):
         """
@@ -557,19 +480,132 @@ class Hamstercage:
         :param path:
         :return: list of manifest path (str), and filesystem path (Path)
         """
-        ppath = Path(path)
-        path = str(path)
-        starget = str(self.target) + "/"
-        if path.startswith(starget):
-            # absolute path including target, strip target
-            return path[len(starget) - 1 :], ppath.absolute()
-        else:
-            if ppath.is_absolute():
-                # prepend target to path
-                return str(path), Path(str(self.target) + str(path))
-            else:
-                #
-                return "/" + str(path), Path(str(self.target) + "/" + str(path))
+        manifest_path = self._manifest_path(path)
+        return manifest_path, Path(self._starget + manifest_path[1:])
+
+    def _parser(self) -> argparse.ArgumentParser:
+        """
+        Create the command line parser.
+        :return: the parser
+        """
+        parser = argparse.ArgumentParser(
+            prog="hamstercage", description="Manage the hamster cage."
+        )
+        parser.add_argument(
+            "-d",
+            "--directory",
+            type=Path,
+            default="/",
+            help="base directory of target files",
+        )
+        parser.add_argument(
+            "-f",
+            "--file",
+            type=Path,
+            default="hamstercage.yaml",
+            help="manifest file to use",
+        )
+        parser.add_argument("-n", "--hostname", default=None, help="name of this host")
+        parser.add_argument(
+            "-r", "--repo", type=Path, default=".", help="directory of file repo"
+        )
+        parser.add_argument("-t", "--tag", type=str, help="tags to apply/save")
+        parser.add_argument(
+            "-v", "--verbose", action="count", default=0, help="verbose output"
+        )
+        parser.set_defaults(func=None)
+
+        subparsers = parser.add_subparsers(help="sub-command help")
+
+        subparser = subparsers.add_parser(
+            "add", help="add one or more files to the manifest"
+        )
+        subparser.set_defaults(func=self.add)
+        subparser.add_argument(
+            "-f",
+            "--force",
+            action="count",
+            default=0,
+            help="overwrite existing entries",
+        )
+        subparser.add_argument("tag", help="tag to add files to")
+        subparser.add_argument("files", nargs="+", help="files to add")
+
+        subparser = subparsers.add_parser(
+            "apply", help="apply files from repo to target"
+        )
+        subparser.set_defaults(func=self.apply)
+        subparser.add_argument(
+            "files", nargs="*", help="limit results to these file patterns"
+        )
+
+        subparser = subparsers.add_parser(
+            "diff", help="print differences between target and repo"
+        )
+        subparser.set_defaults(func=self.diff)
+        subparser.add_argument(
+            "files", nargs="*", help="limit results to these file patterns"
+        )
+
+        subparser = subparsers.add_parser("init", help="create a new manifest")
+        subparser.set_defaults(func=self.init)
+
+        subparser = subparsers.add_parser(
+            "list", aliases=["ls"], help="list manifest entries"
+        )
+        subparser.set_defaults(func=self.list)
+        subparser.add_argument(
+            "-l", "--long", action="count", default=0, help="list format long"
+        )
+        subparser.add_argument(
+            "-t",
+            "--tabs",
+            action="count",
+            default=0,
+            help="separate columns with tabs instead of spaces",
+        )
+        subparser.add_argument(
+            "files", nargs="*", help="limit results to these file patterns"
+        )
+
+        subparser = subparsers.add_parser(
+            "remove",
+            aliases=["del", "rm"],
+            help="remove one or more files from the manifest",
+        )
+        subparser.set_defaults(func=self.remove)
+        subparser.add_argument("tag", help="tag to add files to")
+        subparser.add_argument("files", nargs="+", help="files to remove")
+
+        subparser = subparsers.add_parser("save", help="save target files to repo")
+        subparser.set_defaults(func=self.save)
+        subparser.add_argument(
+            "files", nargs="*", help="limit results to these file patterns"
+        )
+
+        subparser = subparsers.add_parser(
+            "tag",
+            help="manage tags in the manifest",
+        )
+        subparser.set_defaults(func=None)
+
+        tagparsers = subparser.add_subparsers(help="tag command help")
+
+        subparser = tagparsers.add_parser(
+            "add",
+            help="add a tag to the manifest",
+        )
+        subparser.set_defaults(func=self.tag_add)
+        subparser.add_argument("name", help="tag name")
+        subparser.add_argument(
+            "-d",
+            "--description",
+            type=str,
+            default="",
+            help="description for this tag",
+        )
+
+        return parser
 
     def _path_repo_entry(self, tag: str, entry: Entry) -> Path:
         """
@@ -578,10 +614,15 @@ class Hamstercage:
         :param entry: of the file
         :return: path of file
         """
-        return entry.path_as_child_of(self.repo / "tags" / tag)
+        return entry.path_as_child_of(self._path_repo_tag(tag))
 
-    def _path_repo_path_tag(self, repo_path, tag: str):
-        return path_as_child_of(repo_path, self.repo / "tags" / tag)
+    def _path_repo_tag(self, tag: str) -> Path:
+        """
+        Return the directory in the repo holding the files of a tag.
+        :param tag: name of the tag
+        :return: path of directory
+        """
+        return self.repo / "tags" / tag
 
     def _path_target(self, entry: Entry) -> Path:
         """
@@ -622,6 +663,25 @@ class Hamstercage:
                 return r
         return 0
 
+    def _select_files(self, files: list) -> None:
+        """
+        Limit the entries returned by _entries() to the files given on the command line. Files can be given as paths
+        or as shell-style patterns like "/etc/*.conf". As in the shell, wildcards do not match "/", so "/etc/*" does not
+        select "/etc/sub/deep.conf". A pattern also selects the entry with exactly its name, like "/etc/foo[1].conf".
+        An empty list selects all entries.
+        :param files: list of file names or patterns
+        :return: None
+        """
+        self.files = files
+        self._file_set = set()
+        patterns = []
+        for f in files:
+            path = self._manifest_path(f)
+            self._file_set.add(path)
+            if any(c in path for c in "*?["):
+                patterns.append(glob_to_regex(path))
+        self._file_patterns = re.compile("|".join(patterns)) if patterns else None
+
 
 def main():
     h = Hamstercage()
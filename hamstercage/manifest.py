@@ -1,5 +1,6 @@
 import os
 import shutil
+import stat
 import subprocess
 import sys
 import textwrap
@@ -10,8 +11,17 @@ from typing import List
 
 import yaml
 
+import hamstercage
 from hamstercage.hamstercage_exception import HamstercageException
-from hamstercage.utils import chmod, mkdir_with_owner_group_mode, path_as_child_of
+from hamstercage.utils import (
+    chown,
+    files_differ,
+    group_name,
+    mkdir_once,
+    mkdir_with_owner_group_mode,
+    owner_name,
+    stat_or_none,
+)
 
 """
 Manifest of files to be managed.
@@ -22,7 +32,14 @@ class FileMode(int):
     pass
 
 
+# compiled Python hooks, by path and modification time: (source, code)
+_hook_code_cache = {}
+
+
 class Entry(ABC):
+    # there can be many entries; subclasses need to declare __slots__ too
+    __slots__ = ("form", "group", "mode", "owner", "path", "target")
+
     mode: int
     group: str
     owner: str
@@ -46,30 +63,25 @@ class Entry(ABC):
         :return:
         """
         if isinstance(e, Path):
-            if e.is_symlink():
-                # is_dir() and is_file return true if the target is dir or file, so check for symlink first
-                return SymlinkEntry.from_dict(path, {"target": str(e.resolve())})
-            elif e.is_dir():
-                return DirEntry.from_dict(
-                    path,
-                    {
-                        "mode": e.stat().st_mode
-                        & 0o7777,  # limit to standard POSIX bits
-                        "owner": e.owner(),
-                        "group": e.group(),
-                    },
-                )
-            elif e.is_file():
-                return FileEntry.from_dict(
-                    path,
-                    {
-                        "target": e,
-                        "mode": e.stat().st_mode
-                        & 0o7777,  # limit to standard POSIX bits
-                        "owner": e.owner(),
-                        "group": e.group(),
-                    },
+            # lstat, so that symlinks are recognized as such, not as their target
+            try:
+                st = os.lstat(e)
+            except FileNotFoundError:
+                raise HamstercageException(
+                    f'Unable to create entry for "{path}": file not found'
                 )
+            if stat.S_ISLNK(st.st_mode):
+                return SymlinkEntry.from_dict(path, {"target": os.readlink(e)})
+            elif stat.S_ISDIR(st.st_mode) or stat.S_ISREG(st.st_mode):
+                d = {
+                    "mode": st.st_mode & 0o7777,  # limit to standard POSIX bits
+                    "owner": owner_name(st.st_uid),
+                    "group": group_name(st.st_gid),
+                }
+                if stat.S_ISDIR(st.st_mode):
+                    return DirEntry.from_dict(path, d)
+                d["target"] = e
+                return FileEntry.from_dict(path, d)
             raise HamstercageException(
                 f'Unable to create entry for "{path}": unknown file type'
             )
@@ -91,16 +103,27 @@ class Entry(ABC):
         """
         return False
 
-    def apply(self, repo: Path, target: Path):
+    def apply(self, repo: Path, target: Path, known_dirs: set = None):
         """
         Apply the entry to the target dir.
         :param repo: Repo base dir
         :param target: Target base dir
+        :param known_dirs: optional set of target directories known to exist; it is checked instead of the file
+        system, and updated
         :return:
         """
         raise HamstercageException(f"class {self} does not implement apply()")
 
-    def save(self, repo_path, target_path, manifest):
+    def save(self, repo_path, target_path, manifest, known_dirs: set = None):
+        """
+        Save the target file to the repo, and update the entry from it.
+        :param repo_path: path of the entry in the repo
+        :param target_path: path of the entry in the target
+        :param manifest: the manifest this entry belongs to
+        :param known_dirs: optional set of repo directories known to exist; it is checked instead of the file
+        system, and updated
+        :return:
+        """
         raise RuntimeError("Internal error: cannot call abstract base class method")
 
     def path_as_child_of(self, target_path: Path) -> Path:
@@ -109,10 +132,14 @@ class Entry(ABC):
         :param target_path: the base path
         :return: path
         """
-        return path_as_child_of(self.path, target_path)
+        # self.path is always a str, skip the conversion in utils.path_as_child_of
+        path = self.path
+        return target_path / (path[1:] if path.startswith("/") else path)
 
 
 class DirEntry(Entry):
+    __slots__ = ()
+
     def __init__(self, path):
         super().__init__(path)
 
@@ -142,28 +169,34 @@ class DirEntry(Entry):
             "group": self.group,
         }
 
-    def apply(self, repo: Path, target: Path):
-        if target.exists() and not target.is_dir():
+    def apply(self, repo: Path, target: Path, known_dirs: set = None):
+        st = stat_or_none(target)
+        if st is not None and not stat.S_ISDIR(st.st_mode):
             raise HamstercageException(
                 f'Unable to update "{target}" because it exists and is not a directory'
             )
         target.mkdir(self.mode, exist_ok=True, parents=True)
-        shutil.chown(str(target), self.owner, self.group)
+        if known_dirs is not None:
+            known_dirs.add(target)
+        chown(target, self.owner, self.group)
 
-    def save(self, repo_path, target_path, manifest):
+    def save(self, repo_path, target_path, manifest, known_dirs: set = None):
         if target_path.exists() and not target_path.is_dir:
             raise HamstercageException(
                 f'Unable to update "{target_path}" because it exists and is not a directory'
             )
-        self.group = target_path.group()
-        self.mode = target_path.stat().st_mode & 0o7777
-        self.owner = target_path.owner()
+        st = target_path.stat()
+        self.group = group_name(st.st_gid)
+        self.mode = st.st_mode & 0o7777
+        self.owner = owner_name(st.st_uid)
 
     def __str__(self):
         return f"SymlinkEntry<form={self.form}, path={self.path}, target={self.target}>"
 
 
 class FileEntry(Entry):
+    __slots__ = ()
+
     def __init__(self, path):
         super().__init__(path)
 
@@ -202,30 +235,41 @@ class FileEntry(Entry):
         """
         return True
 
-    def apply(self, repo: Path, target: Path):
-        if target.exists() and not target.is_file():
+    def apply(self, repo: Path, target: Path, known_dirs: set = None):
+        if known_dirs is None:
+            known_dirs = set()
+        st = stat_or_none(target)
+        if st is not None and not stat.S_ISREG(st.st_mode):
             raise HamstercageException(
                 f'Unable to update "{target}" because it exists and is not a file'
             )
-        target.parent.mkdir(exist_ok=True, parents=True)
-        shutil.copy2(str(repo), str(target))
-        chmod(str(target), self.mode)
-        shutil.chown(str(target), self.owner, self.group)
-
-    def save(self, repo_path, target_path, manifest):
+        mkdir_once(target.parent, known_dirs)
+        if files_differ(repo, target, b_stat=st):
+            shutil.copy2(str(repo), str(target))
+        # target is a regular file here, set the mode even if the copy was skipped
+        os.chmod(target, self.mode)
+        chown(target, self.owner, self.group)
+
+    def save(self, repo_path, target_path, manifest, known_dirs: set = None):
         if repo_path.exists() and not repo_path.is_file():
             raise HamstercageException(
                 f"Unable to add {repo_path}: another directory entry already exists here"
             )
         try:
-            self.group = target_path.group()
-            self.mode = target_path.stat().st_mode & 0o7777
-            self.owner = target_path.owner()
+            st = target_path.stat()
+            self.group = group_name(st.st_gid)
+            self.mode = st.st_mode & 0o7777
+            self.owner = owner_name(st.st_uid)
             mkdir_with_owner_group_mode(
-                repo_path.parent, manifest.owner, manifest.group, manifest.dir_mode
+                repo_path.parent,
+                manifest.owner,
+                manifest.group,
+                manifest.dir_mode,
+                known_dirs,
             )
-            shutil.copy2(target_path, repo_path, follow_symlinks=False)
-            shutil.chown(repo_path, manifest.owner, manifest.group)
+            if files_differ(target_path, repo_path, st):
+                shutil.copy2(target_path, repo_path, follow_symlinks=False)
+            chown(repo_path, manifest.owner, manifest.group)
             repo_path.chmod(manifest.file_mode)
         except FileNotFoundError as e:
             raise HamstercageException(
@@ -240,6 +284,8 @@ class FileEntry(Entry):
 
 
 class SymlinkEntry(Entry):
+    __slots__ = ()
+
     def __init__(self, path):
         super().__init__(path)
 
@@ -270,17 +316,26 @@ class SymlinkEntry(Entry):
             "target": self.target,
         }
 
-    def apply(self, repo: Path, target: Path):
-        if target.exists() and not target.is_symlink():
+    def apply(self, repo: Path, target: Path, known_dirs: set = None):
+        if known_dirs is None:
+            known_dirs = set()
+        st = stat_or_none(target, follow_symlinks=False)
+        if st is not None and not stat.S_ISLNK(st.st_mode):
             raise HamstercageException(
                 f'Unable to update "{target}" because it exists and is not a symbolic link'
             )
-        target.parent.mkdir(exist_ok=True, parents=True)
-        if target.exists():
+        mkdir_once(target.parent, known_dirs)
+        if st is not None:
             target.unlink()
         target.symlink_to(self.target)
 
-    def save(self, repo_path: Path, target_path: Path, manifest: "Manifest"):
+    def save(
+        self,
+        repo_path: Path,
+        target_path: Path,
+        manifest: "Manifest",
+        known_dirs: set = None,
+    ):
         if target_path.exists() and not target_path.is_symlink():
             raise HamstercageException(
                 f'Unable to save "{target_path}" because it is not a symbolic link'
@@ -296,6 +351,8 @@ class Host:
     Represents one host in the manifest.
     """
 
+    __slots__ = ("description", "name", "tags")
+
     description: str
     name: str
     tags: List[str]
@@ -315,11 +372,12 @@ class Host:
             raise HamstercageException(
                 f'Invalid host definition for "{n}": must have a list of tags'
             )
-        host.tags = d["tags"]
+        host.tags = list(d["tags"])
         return host
 
     def to_dict(self) -> dict:
-        d = {"tags": self.tags}
+        # a copy, so the snapshot kept by Manifest.dump() does not change with self.tags
+        d = {"tags": list(self.tags)}
         if len(self.description) > 0:
             d["description"] = self.description
         return d
@@ -330,6 +388,8 @@ class Hook:
     Represents one hook in a tag.
     """
 
+    __slots__ = ("command", "description", "name", "type")
+
     command: str
     description: str
     name: str
@@ -392,15 +452,23 @@ class Hook:
             "cmd": cmd,
             "manifest": manifest,
             "hook": self.name,
-            "repo": str(Path(manifest.manifest_file).parent),
+            "repo": str(manifest.manifest_dir),
             "step": step,
             "tag": tag,
             "__file__": str(path),
             "__name__": "__hamstercage__",
         }
-        script = path.read_text("utf-8")
+        key = (str(path), path.stat().st_mtime_ns)
+        if key in _hook_code_cache:
+            script, code = _hook_code_cache[key]
+        else:
+            script = path.read_text("utf-8")
+            code = None
         try:
-            exec(script, globals)
+            if code is None:
+                code = compile(script, str(path), "exec")
+                _hook_code_cache[key] = (script, code)
+            exec(code, globals)
             return 0
         except SyntaxError as e:
             lines = script.split("\n")
@@ -436,7 +504,7 @@ class Hook:
         env["HAMSTERCAGE_CMD"] = cmd
         env["HAMSTERCAGE_MANIFEST"] = manifest.manifest_file
         env["HAMSTERCAGE_HOOK"] = self.name
-        env["HAMSTERCAGE_REPO"] = str(Path(manifest.manifest_file).parent)
+        env["HAMSTERCAGE_REPO"] = str(manifest.manifest_dir)
         env["HAMSTERCAGE_STEP"] = step
         env["HAMSTERCAGE_TAG"] = tag.name
         r = subprocess.call(args, env=env, shell=shell)
@@ -450,7 +518,7 @@ class Hook:
     def _get_path(self, manifest: "Manifest"):
         path = Path(self.command)
         if not path.is_absolute():
-            path = Path(manifest.manifest_file).parent / path
+            path = manifest.manifest_dir / path
         return path
 
 
@@ -459,6 +527,8 @@ class Tag:
     Represents a tag definition in the manifest.
     """
 
+    __slots__ = ("_entries", "_entry_dicts", "description", "hooks", "name")
+
     description: str
     name: str
 
@@ -467,7 +537,9 @@ class Tag:
         self.description = ""
         if description is not None:
             self.description = description
-        self.entries = {}
+        self._entries = {}
+        # entries as loaded from the manifest, turned into Entry objects on first use
+        self._entry_dicts = None
         self.hooks = {}
 
     @staticmethod
@@ -476,27 +548,40 @@ class Tag:
         if "description" in d:
             tag.description = d["description"]
         if "entries" in d:
+            # check the entries now, so errors in the manifest surface on load; the Entry objects are created on use
             for p, e in d["entries"].items():
-                entry = Entry.entry(p, e)
-                tag.entries[p] = entry
+                if not isinstance(e, dict):
+                    raise HamstercageException(
+                        f'In definition of entry "{p}": expected a mapping'
+                    )
+                t = e.get("type", "file")
+                if t not in ("dir", "file", "link"):
+                    raise HamstercageException(f'Unknown entry type "{t}"')
+                if t == "link" and "target" not in e:
+                    raise HamstercageException("missing target attribute for symlink")
+            tag._entry_dicts = d["entries"]
         if "hooks" in d:
-            for p, e in d["hooks"].items():
-                entry = Hook.from_dict(p, e)
-                tag.hooks[p] = entry
+            tag.hooks = {p: Hook.from_dict(p, e) for p, e in d["hooks"].items()}
         return tag
 
+    @property
+    def entries(self) -> dict:
+        """
+        The entries of this tag, by path. Entries of tags that are not used by a command are never created.
+        """
+        if self._entry_dicts is not None:
+            self._entries = {p: Entry.entry(p, e) for p, e in self._entry_dicts.items()}
+            self._entry_dicts = None
+        return self._entries
+
     def to_dict(self) -> dict:
         d = {}
         if len(self.description) > 0:
             d["description"] = self.description
         if len(self.entries) > 0:
-            d["entries"] = {}
-            for path, entry in self.entries.items():
-                d["entries"][path] = entry.to_dict()
+            d["entries"] = {p: e.to_dict() for p, e in self.entries.items()}
         if len(self.hooks) > 0:
-            d["hooks"] = {}
-            for path, entry in self.hooks.items():
-                d["hooks"][path] = entry.to_dict()
+            d["hooks"] = {p: h.to_dict() for p, h in self.hooks.items()}
         return d
 
     def find_hook(self, command: str, step: str) -> Hook:
@@ -506,6 +591,8 @@ class Tag:
         :param step:
         :return:
         """
+        if not self.hooks:
+            return None
         hook = None
         for n in (f"{step}-{command}", f"*-{command}", f"{step}-*", "*"):
             hook = self.hooks.get(n)
@@ -522,53 +609,51 @@ class Manifest:
     file_mode: int
     group: int
     hosts: dict
+    manifest_dir: Path
     manifest_file: str
     owner: int
     tags: dict
 
     def __init__(self, file: str) -> None:
         self.manifest_file = str(file)
+        self.manifest_dir = Path(self.manifest_file).parent
         self.hosts = {}
         self.tags = {}
+        # contents of the manifest file as last loaded or written
+        self._saved = None
 
     def load(self) -> None:
         """
         Load the manifest from the repository.
         :return:
         """
-        with open(self.manifest_file, "r") as stream:
-            manifest = yaml.safe_load(stream)
-        mp = Path(self.manifest_file)
-        mst = mp.stat()
+        with open(self.manifest_file, "rb") as stream:
+            mst = os.fstat(stream.fileno())
+            manifest = yaml.load(stream.read(), Loader=hamstercage.Loader)
         self.owner = mst.st_uid
         self.group = mst.st_gid
         self.file_mode = mst.st_mode
         self.dir_mode = (
             self.file_mode | (self.file_mode & 0o0444) >> 2
         )  # copy r bit to x bit
-        self.hosts = {}
-        self.tags = {}
-        for name, tag in manifest["tags"].items():
-            self.tags[name] = Tag.from_dict(name, tag)
-        for n, h in manifest["hosts"].items():
-            host = Host.from_dict(n, h)
-            self.hosts[n] = host
+        self.tags = {n: Tag.from_dict(n, t) for n, t in manifest["tags"].items()}
+        self.hosts = {n: Host.from_dict(n, h) for n, h in manifest["hosts"].items()}
+        self._saved = manifest
 
     def dump(self) -> None:
         """
-        Save the manifest to the repository.
+        Save the manifest to the repository. The file is only written if the manifest has changed.
         :return:
         """
         manifest = {
-            "hosts": {},
-            "tags": {},
+            "hosts": {n: h.to_dict() for n, h in self.hosts.items()},
+            "tags": {n: t.to_dict() for n, t in self.tags.items()},
         }
-        for name, entry in self.hosts.items():
-            manifest["hosts"][name] = entry.to_dict()
-        for name, entry in self.tags.items():
-            manifest["tags"][name] = entry.to_dict()
+        if manifest == self._saved:
+            return
         with open(self.manifest_file, "w") as stream:
-            yaml.dump(manifest, stream)
+            yaml.dump(manifest, stream, Dumper=hamstercage.Dumper)
+        self._saved = manifest
 
     @staticmethod
     def normalize_path(path):
@@ -576,7 +661,6 @@ class Manifest:
         Returns the normal form of a path
         :return:
         """
-        path = str(path)
-        if path.endswith("/"):
-            path = path[0:-1]
-        return path
+        if not isinstance(path, str):
+            path = str(path)
+        return path[:-1] if path.endswith("/") else path
@@ -1,45 +1,62 @@
 import io
 import os
-import unittest
+import shutil
+import stat
+import tempfile
 from contextlib import redirect_stdout
 from datetime import datetime
 from pathlib import Path
 from unittest import TestCase
 
-import grp
 import pytest
 import time
 from importlib_resources import files
-from pwd import getpwuid
 
 from hamstercage.__main__ import Hamstercage
 from hamstercage.hamstercage_exception import HamstercageException
-from hamstercage.manifest import Hook
-from hamstercage.utils import chmod
+from hamstercage.manifest import FileEntry, Hook
+from hamstercage.utils import chmod, group_name, owner_name
 
-RUNNING_ON_GITHUB = int(os.environ.get("RUNNING_ON_GITHUB", 0))
+
+def _mode_bits_supported() -> bool:
+    """
+    Probe whether the file system used for temporary files keeps mode changes.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        probe = Path(tmpdir) / "mode"
+        probe.touch(0o644)
+        os.chmod(probe, 0o444)
+        return stat.S_IMODE(os.lstat(probe).st_mode) == 0o444
 
 
 class TestHamstercage(TestCase):
     @pytest.fixture(autouse=True)
-    def initdir(self, tmpdir):
-        self.tmpdir = tmpdir
-        self.user = getpwuid(os.stat(self.tmpdir).st_uid).pw_name
-        self.group = grp.getgrgid(os.stat(self.tmpdir).st_gid).gr_name
-        self.now = time.time()
+    def initdir(self, tmp_path):
+        self.tmpdir = tmp_path
+        st = os.stat(self.tmpdir)
+        self.user = owner_name(st.st_uid)
+        self.group = group_name(st.st_gid)
+        self.now_ns = time.time_ns()
+        # how list shows files touched with _touch()
+        self.now_hhmm = datetime.fromtimestamp(self.now_ns // 1_000_000_000).strftime(
+            "%H:%M"
+        )
 
     def prepare_hamstercage(self, create=True) -> Hamstercage:
         dut = Hamstercage()
         dut.manifest_file = self.tmpdir / "hamstercage.yaml"
         dut.hostname = "testing.example.com"
-        dut.target = Path(self.tmpdir) / "target"
-        dut.repo = Path(self.tmpdir) / "repo"
+        dut.target = self.tmpdir / "target"
+        dut.repo = self.tmpdir / "repo"
         if create:
             dut.init(None)
             chmod(dut.manifest_file, 0o664)
             dut.target.mkdir()
         return dut
 
+    def _touch(self, path: Path, follow_symlinks=True):
+        os.utime(path, ns=(self.now_ns, self.now_ns), follow_symlinks=follow_symlinks)
+
     def _add_file(self, files: dict, name: str, target: Path):
         files[name] = target / name
         files[name].write_text(f"Test file {name}")
@@ -65,7 +82,7 @@ class TestHamstercage(TestCase):
         dir_to_add = "a-dir"
         path_to_add = dut.target / dir_to_add
         path_to_add.mkdir()
-        os.utime(path_to_add, (self.now, self.now))
+        self._touch(path_to_add)
 
         args = Args(files=[dir_to_add], tag="all")
         r = dut.add(args)
@@ -100,7 +117,7 @@ class TestHamstercage(TestCase):
         path_to_add = dut.target / file_to_add
         path_to_add.write_text("Hello, world!", "utf-8")
         path_to_add.chmod(0o760)
-        os.utime(path_to_add, (self.now, self.now))
+        self._touch(path_to_add)
 
         args = Args(files=[path_to_add], tag="all")
         r = dut.add(args)
@@ -135,7 +152,6 @@ class TestHamstercage(TestCase):
         link_to_add = "a-link"
         path_to_add = dut.target / link_to_add
         path_to_add.symlink_to("/dev/null")
-        os.utime(path_to_add, (self.now, self.now), follow_symlinks=False)
 
         args = Args(files=[link_to_add], tag="all")
         r = dut.add(args)
@@ -170,18 +186,18 @@ class TestHamstercage(TestCase):
         self.dir_to_add = "a-dir"
         self.dir_path = dut.target / self.dir_to_add
         self.dir_path.mkdir()
-        os.utime(self.dir_path, (self.now, self.now))
+        self._touch(self.dir_path)
 
         self.file_to_add = "foo.txt"
         self.file_path = dut.target / self.file_to_add
         self.file_path.write_text("Hello, world!", "utf-8")
         self.file_path.chmod(0o644)
-        os.utime(self.file_path, (self.now, self.now))
+        self._touch(self.file_path)
 
         self.link_to_add = "a-link"
         self.link_path = dut.target / self.link_to_add
         self.link_path.symlink_to("/dev/null")
-        os.utime(self.link_path, (self.now, self.now), follow_symlinks=False)
+        self._touch(self.link_path, follow_symlinks=False)
 
         args = Args(
             files=[self.dir_to_add, self.file_to_add, self.link_to_add], tag="all"
@@ -203,7 +219,7 @@ class TestHamstercage(TestCase):
         )
         dut.manifest.tags["all"].hooks[hook.name] = hook
 
-        dut.target = Path(self.tmpdir) / "apply"
+        dut.target = self.tmpdir / "apply"
         args = Args(files=[])
         r = dut.apply(args)
         self.assertEqual(0, r)
@@ -212,17 +228,27 @@ class TestHamstercage(TestCase):
         self.assert_path_equal(self.link_path, dut.target / self.link_to_add)
         assert hook_status_file.exists()
 
-        # again to make sure it's idempotent
-        r = dut.apply(args)
+        return dut
+
+    def test_apply_idempotent(self):
+        dut = self.perform_apply()
+
+        r = dut.apply(Args(files=[]))
         self.assertEqual(0, r)
         self.assert_path_equal(self.dir_path, dut.target / self.dir_to_add)
         self.assert_path_equal(self.file_path, dut.target / self.file_to_add)
         self.assert_path_equal(self.link_path, dut.target / self.link_to_add)
 
-        return dut
+    def test_apply_target_removed(self):
+        dut = self.perform_apply()
+        shutil.rmtree(dut.target)
+
+        r = dut.apply(Args(files=[self.file_to_add]))
+        self.assertEqual(0, r)
+        self.assert_path_equal(self.file_path, dut.target / self.file_to_add)
 
-    @unittest.skipIf(
-        RUNNING_ON_GITHUB, "Github runner does not support mode bits on /tmp"
+    @pytest.mark.skipif(
+        not _mode_bits_supported(), reason="the file system does not keep mode bits"
     )
     def test_apply_mode_change(self):
         self.perform_apply_mode_change()
@@ -236,7 +262,7 @@ class TestHamstercage(TestCase):
         )
         dut.manifest.tags["all"].hooks[hook.name] = hook
 
-        dut.target = Path(self.tmpdir) / "apply"
+        dut.target = self.tmpdir / "apply"
         args = Args(files=[])
         r = dut.apply(args)
         self.assertEqual(0, r)
@@ -254,6 +280,18 @@ class TestHamstercage(TestCase):
 
         return dut
 
+    def test_apply_same_size_and_mtime(self):
+        dut = self.perform_apply()
+        repo_file = dut.repo / "tags" / "all" / self.file_to_add
+        target_file = dut.target / self.file_to_add
+        repo_file.write_text("Hello, World!", "utf-8")
+        st = target_file.stat()
+        os.utime(repo_file, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        r = dut.apply(Args(files=[]))
+        self.assertEqual(0, r)
+        self.assertEqual("Hello, World!", target_file.read_text("utf-8"))
+
     def test_apply_target_exists(self):
         dut = self.perform_apply()
 
@@ -273,6 +311,26 @@ class TestHamstercage(TestCase):
         with self.assertRaises(HamstercageException):
             r = dut.apply(args)
 
+    def test_apply_changed(self):
+        dut = self.perform_apply()
+
+        path = dut.target / self.file_to_add
+        path.write_text("Goodbye, world!", "utf-8")
+        r = dut.apply(Args(files=[]))
+        self.assertEqual(0, r)
+        self.assertEqual("Hello, world!", path.read_text("utf-8"))
+
+    def test_apply_one(self):
+        dut = self.perform_add_many()
+
+        dut.target = self.tmpdir / "apply"
+        args = Args(files=[self.file_to_add])
+        r = dut.apply(args)
+        self.assertEqual(0, r)
+        self.assert_path_equal(self.file_path, dut.target / self.file_to_add)
+        self.assertFalse((dut.target / self.dir_to_add).exists())
+        self.assertFalse((dut.target / self.link_to_add).exists())
+
     def test_diff_binary(self):
         dut = self.perform_add_many()
 
@@ -335,7 +393,7 @@ class TestHamstercage(TestCase):
         path_to_add = dut.target / file_to_add
         path_to_add.write_text("Hello, world!", "utf-8")
         path_to_add.chmod(0o760)
-        os.utime(path_to_add, (self.now, self.now))
+        self._touch(path_to_add)
 
         args = Args(name="other")
         r = dut.tag_add(args)
@@ -381,7 +439,6 @@ class TestHamstercage(TestCase):
             r = dut.list(args)
         self.assertEqual(0, r)
 
-        t = datetime.fromtimestamp(os.stat(self.file_path).st_mtime).strftime("%H:%M")
         self.assertEqual(
             [
                 str(self.dir_path),
@@ -400,20 +457,12 @@ class TestHamstercage(TestCase):
             r = dut.list(args)
         self.assertEqual(0, r)
 
-        ts_dir = datetime.fromtimestamp(os.stat(self.dir_path).st_mtime).strftime(
-            "%H:%M"
-        )
-        ts_file = datetime.fromtimestamp(os.stat(self.file_path).st_mtime).strftime(
-            "%H:%M"
-        )
-        ts_link = datetime.fromtimestamp(os.stat(self.link_path).st_mtime).strftime(
-            "%H:%M"
-        )
+        ts = self.now_hhmm
         self.assertEqual(
             [
-                f" \tdrwxr-xr-x\t{self.user}\t{self.group}\t0\t{ts_dir}\tall\t{self.dir_path}/",
-                f" \tlrw-r--r--\troot\troot\t0\t{ts_link}\tall\t{self.link_path} -> /dev/null",
-                f" \t-rw-r--r--\t{self.user}\t{self.group}\t13\t{ts_file}\tall\t{self.file_path}",
+                f" \tdrwxr-xr-x\t{self.user}\t{self.group}\t0\t{ts}\tall\t{self.dir_path}/",
+                f" \tlrw-r--r--\troot\troot\t0\t{ts}\tall\t{self.link_path} -> /dev/null",
+                f" \t-rw-r--r--\t{self.user}\t{self.group}\t13\t{ts}\tall\t{self.file_path}",
                 "",
             ],
             stdout.getvalue().split("\n"),
@@ -427,17 +476,43 @@ class TestHamstercage(TestCase):
             r = dut.list(args)
         self.assertEqual(0, r)
 
-        ts_file = datetime.fromtimestamp(os.stat(self.file_path).st_mtime).strftime(
-            "%H:%M"
-        )
         self.assertEqual(
             [
-                f" \t-rw-r--r--\t{self.user}\t{self.group}\t13\t{ts_file}\tall\t{self.file_path}",
+                f" \t-rw-r--r--\t{self.user}\t{self.group}\t13\t{self.now_hhmm}\tall\t{self.file_path}",
                 "",
             ],
             stdout.getvalue().split("\n"),
         )
 
+    def test_list_pattern(self):
+        dut = self.perform_add_many()
+
+        args = Args(files=["a-*"], long=0)
+        with redirect_stdout(io.StringIO()) as stdout:
+            r = dut.list(args)
+        self.assertEqual(0, r)
+        self.assertEqual(
+            [str(self.dir_path), str(self.link_path), ""],
+            stdout.getvalue().split("\n"),
+        )
+
+    def test_select_files(self):
+        dut = self.prepare_hamstercage()
+
+        def entry(path):
+            return FileEntry.from_dict(path, {"type": "file"})
+
+        dut._select_files(["/etc/*", "/etc/foo[1].conf"])
+        assert dut._files_match(entry("/etc/a.conf"))
+        assert dut._files_match(entry("/etc/foo[1].conf"))
+        assert not dut._files_match(entry("/etc/foo1.conf/x"))
+        assert not dut._files_match(entry("/etc/sub/deep.conf"))
+        assert not dut._files_match(entry("/var/a.conf"))
+
+        dut._select_files(["/etc/*/*.conf"])
+        assert dut._files_match(entry("/etc/sub/deep.conf"))
+        assert not dut._files_match(entry("/etc/a.conf"))
+
     def test_list_long_missing(self):
         dut = self.perform_add_many()
         self.file_path.unlink()
@@ -451,17 +526,15 @@ class TestHamstercage(TestCase):
         dut = self.perform_add_many()
         self.link_path.unlink()
         self.link_path.write_text("Hello, world!", "utf-8")
+        self._touch(self.link_path)
 
         args = Args(files=[str(self.link_path)], long=1)
         with redirect_stdout(io.StringIO()) as stdout:
             r = dut.list(args)
         self.assertEqual(0, r)
-        ts_link = datetime.fromtimestamp(os.stat(self.link_path).st_mtime).strftime(
-            "%H:%M"
-        )
         self.assertEqual(
             [
-                f"!\tlrw-r--r--\troot\troot\t13\t{ts_link}\tall\t{self.link_path} -> /dev/null",
+                f"!\tlrw-r--r--\troot\troot\t13\t{self.now_hhmm}\tall\t{self.link_path} -> /dev/null",
                 "",
             ],
             stdout.getvalue().split("\n"),
@@ -473,6 +546,21 @@ class TestHamstercage(TestCase):
             r = dut.main([])
         self.assertEqual(64, r)
 
+    def test_mtime(self):
+        path = self.tmpdir / "foo.txt"
+        path.write_text("Hello, world!", "utf-8")
+
+        os.utime(path, ns=(1_600_000_000_123_456_789, 1_600_000_000_123_456_789))
+        assert Hamstercage._mtime(path) == (
+            datetime.fromtimestamp(1_600_000_000).isoformat() + ".123456"
+        )
+
+        os.utime(path, ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+        assert (
+            Hamstercage._mtime(path)
+            == datetime.fromtimestamp(1_600_000_000).isoformat()
+        )
+
     def test_normalize_target_path(self):
         dut = self.prepare_hamstercage()
 
@@ -483,6 +571,16 @@ class TestHamstercage(TestCase):
             dut.target / "foo",
         )
 
+        dut.target = Path("/")
+        assert dut._normalize_target_path("/etc/profile") == (
+            "/etc/profile",
+            Path("/etc/profile"),
+        )
+        assert dut._normalize_target_path("etc/profile") == (
+            "/etc/profile",
+            Path("/etc/profile"),
+        )
+
     def test_remove_file(self):
         dut = self.prepare_hamstercage()
 
@@ -550,6 +648,26 @@ class TestHamstercage(TestCase):
         entry = dut.manifest.tags["all"].entries["/" + link_to_add]
         self.assertEqual("/dev/zero", entry.target)
 
+    def test_save_same_size_and_mtime(self):
+        dut = self.perform_add_many()
+        repo_file = dut.repo / "tags" / "all" / self.file_to_add
+        self.file_path.write_text("Hello, World!", "utf-8")
+        st = repo_file.stat()
+        os.utime(self.file_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        r = dut.save(Args(files=[self.file_to_add]))
+        self.assertEqual(0, r)
+        self.assertEqual("Hello, World!", repo_file.read_text("utf-8"))
+
+    def test_save_repo_removed(self):
+        dut = self.perform_add_many()
+        shutil.rmtree(dut.repo)
+
+        r = dut.save(Args(files=[self.file_to_add]))
+        self.assertEqual(0, r)
+        f = (dut.repo / "tags" / "all" / self.file_to_add).read_text("utf-8")
+        self.assertEqual("Hello, world!", f)
+
     def test_save_duplicate(self):
         dut = self.prepare_hamstercage()
 
@@ -611,17 +729,26 @@ class TestHamstercage(TestCase):
         assert dut.manifest.tags["foo"].description == "bar"
 
     def assert_path_equal(self, expected_path: Path, actual_path: Path):
-        if not expected_path.exists():
+        # a single lstat per path, so symlinks are seen as such and not as their target
+        try:
+            expected_stat = os.lstat(expected_path)
+        except FileNotFoundError:
             raise AssertionError(f"{expected_path} does not exist")
-        if not actual_path.exists():
+        try:
+            actual_stat = os.lstat(actual_path)
+        except FileNotFoundError:
             raise AssertionError(f"{actual_path} does not exist")
-        expected_stat = expected_path.stat()
-        actual_stat = actual_path.stat()
-        if expected_path.is_dir() and not actual_path.is_dir():
+        if stat.S_ISDIR(expected_stat.st_mode) and not stat.S_ISDIR(
+            actual_stat.st_mode
+        ):
             raise AssertionError(f"{expected_path} should be a directory but isn't")
-        if expected_path.is_file() and not actual_path.is_file():
+        if stat.S_ISREG(expected_stat.st_mode) and not stat.S_ISREG(
+            actual_stat.st_mode
+        ):
             raise AssertionError(f"{expected_path} should be a file but isn't")
-        if expected_path.is_symlink() and not actual_path.is_symlink():
+        if stat.S_ISLNK(expected_stat.st_mode) and not stat.S_ISLNK(
+            actual_stat.st_mode
+        ):
             raise AssertionError(f"{expected_path} should be a symlink but isn't")
         if expected_stat.st_uid != actual_stat.st_uid:
             raise AssertionError(
@@ -638,8 +765,7 @@ class TestHamstercage(TestCase):
 
 
 class Args:
-    files = []
-    force = 0
+    __slots__ = ("description", "files", "force", "long", "name", "tag")
 
     def __init__(
         self, description=None, files=None, force=0, long=0, name=None, tag=None
@@ -1,6 +1,4 @@
-import grp
 import os
-import pwd
 import textwrap
 import unittest
 from pathlib import Path
@@ -8,24 +6,27 @@ from pathlib import Path
 import pytest
 import yaml
 
+from .. import Dumper
 from ..__main__ import Hamstercage
 from ..hamstercage_exception import HamstercageException
-from ..manifest import FileEntry, Manifest, Tag
+from ..manifest import Entry, FileEntry, Manifest, SymlinkEntry, Tag
+from ..utils import group_name, owner_name
 
 
 class TestHamstercage(unittest.TestCase):
     @pytest.fixture(autouse=True)
-    def initdir(self, tmpdir):
-        self.tmpdir = tmpdir
-        self.user = pwd.getpwuid(os.stat(self.tmpdir).st_uid).pw_name
-        self.group = grp.getgrgid(os.stat(self.tmpdir).st_gid).gr_name
+    def initdir(self, tmp_path):
+        self.tmpdir = tmp_path
+        st = os.stat(self.tmpdir)
+        self.user = owner_name(st.st_uid)
+        self.group = group_name(st.st_gid)
 
     def prepare_hamstercage(self) -> Hamstercage:
         dut = Hamstercage()
         dut.manifest_file = self.tmpdir / "hamstercage.yaml"
         dut.hostname = "testing.example.com"
-        dut.target = Path(self.tmpdir) / "target"
-        dut.repo = Path(self.tmpdir) / "repo"
+        dut.target = self.tmpdir / "target"
+        dut.repo = self.tmpdir / "repo"
         dut.init(None)
         os.chmod(dut.manifest_file, 0o664)
         dut.target.mkdir()
@@ -53,11 +54,18 @@ class TestHamstercage(unittest.TestCase):
         }
         p = self.tmpdir / "with_hook.yaml"
         with open(p, "w") as stream:
-            yaml.dump(manifest, stream)
+            yaml.dump(manifest, stream, Dumper=Dumper)
         dut = Manifest(p)
         dut.load()
         return dut
 
+    def test_entry_relative_symlink(self):
+        link = self.tmpdir / "a-link"
+        link.symlink_to("foo.txt")
+        dut = Entry.entry("/a-link", link)
+        assert isinstance(dut, SymlinkEntry)
+        assert dut.target == "foo.txt"
+
     def test_FileEntry_from_dict(self):
         dut = FileEntry.from_dict(
             "foo",
@@ -73,6 +81,30 @@ class TestHamstercage(unittest.TestCase):
         assert dut.mode == 0o755
         assert dut.owner == "root"
 
+    def test_dump_unchanged(self):
+        dut = Manifest(self.prepare_hamstercage().manifest_file)
+        dut.load()
+        os.utime(dut.manifest_file, ns=(0, 0))
+        dut.dump()
+        assert os.stat(dut.manifest_file).st_mtime_ns == 0
+
+        dut.tags["all"].description = "changed"
+        dut.dump()
+        assert os.stat(dut.manifest_file).st_mtime_ns != 0
+        dut.load()
+        assert dut.tags["all"].description == "changed"
+
+    def test_dump_after_host_tags_changed(self):
+        dut = Manifest(self.prepare_hamstercage().manifest_file)
+        dut.load()
+        dut.tags["all"].description = "changed"
+        dut.dump()
+
+        dut.hosts["testing.example.com"].tags.append("other")
+        dut.dump()
+        dut.load()
+        assert dut.hosts["testing.example.com"].tags == ["all", "other"]
+
     def test_load_hook(self):
         dut = self.manifest_with_hooks(
             {
@@ -229,6 +261,28 @@ class TestHamstercage(unittest.TestCase):
             == 'Error executing hook "*" "true && false": command exited with 1'
         )
 
+    def test_run_hook_shell_multi_line(self):
+        out = self.tmpdir / "out"
+        dut = self.manifest_with_hooks(
+            {"*": {"command": f"touch {out}\ntrue", "type": "shell"}}
+        )
+        h = dut.tags["all"].hooks["*"]
+
+        r = h.call(dut, "apply", "post", dut.tags["all"])
+        assert r == 0
+        assert out.exists()
+        assert not (self.tmpdir / "true").exists()
+
+    def test_run_hook_shell_script_without_shebang(self):
+        script = self.tmpdir / "no_shebang"
+        script.write_text("exit 0\n", "utf-8")
+        os.chmod(script, 0o755)
+        dut = self.manifest_with_hooks({"*": {"command": str(script), "type": "shell"}})
+        h = dut.tags["all"].hooks["*"]
+
+        r = h.call(dut, "apply", "post", dut.tags["all"])
+        assert r == 0
+
     def test_run_hook_shell_true(self):
         dut = self.manifest_with_hooks(
             {
@@ -246,6 +300,19 @@ class TestHamstercage(unittest.TestCase):
         r = h.call(dut, "apply", "post", dut.tags["all"])
         assert r == 0
 
+    def test_tag_entries_created_on_use(self):
+        dut = Tag.from_dict("all", {"entries": {"foo.txt": {"type": "file"}}})
+        self.assertIsNone(dut._entries.get("foo.txt"))
+        self.assertIsInstance(dut.entries["foo.txt"], FileEntry)
+
+    def test_tag_entries_checked_on_load(self):
+        with self.assertRaises(HamstercageException):
+            Tag.from_dict("all", {"entries": {"foo.txt": {"type": "unknown"}}})
+        with self.assertRaises(HamstercageException):
+            Tag.from_dict("all", {"entries": {"foo": {"type": "link"}}})
+        with self.assertRaises(HamstercageException):
+            Tag.from_dict("all", {"entries": {"foo.txt": "file"}})
+
     def test_tag_find_hook_with_star(self):
         dut = Tag.from_dict(
             "all",
@@ -1,11 +1,132 @@
 import io
+import os
+import re
+import stat
 import unittest
 from datetime import datetime, timedelta
 
-from hamstercage.utils import mode_to_str, short_date, print_table
+import pytest
+
+from hamstercage.utils import (
+    chmod,
+    chown,
+    ensure_last_line_ends_in_newline,
+    files_differ,
+    glob_to_regex,
+    group_name,
+    mkdir_once,
+    mkdir_with_owner_group_mode,
+    mode_to_str,
+    owner_name,
+    short_date,
+    print_table,
+)
 
 
 class TestHamstercage(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def initdir(self, tmp_path):
+        self.tmpdir = tmp_path
+        st = os.stat(self.tmpdir)
+        self.uid = st.st_uid
+        self.gid = st.st_gid
+        self.user = owner_name(st.st_uid)
+        self.group = group_name(st.st_gid)
+
+    def test_chmod(self):
+        path = self.tmpdir / "a"
+        path.touch(0o644)
+        link = self.tmpdir / "link"
+        link.symlink_to(path)
+
+        chmod(path, 0o600)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+        # never changes the file a symlink points to
+        chmod(link, 0o444)
+        assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+    def test_chown(self):
+        path = self.tmpdir / "a"
+        path.touch()
+        chown(path, self.user, self.group)
+        st = path.stat()
+        assert (st.st_uid, st.st_gid) == (self.uid, self.gid)
+        with self.assertRaises(LookupError):
+            chown(path, "no such user", self.group)
+
+    def test_ensure_last_line_ends_in_newline(self):
+        for lines, expected in [
+            ([], []),
+            ([""], ["\n"]),
+            (["a\n", "b"], ["a\n", "b\n"]),
+            (["a\n", "b\n"], ["a\n", "b\n"]),
+        ]:
+            ensure_last_line_ends_in_newline(lines)
+            assert lines == expected
+
+    def test_files_differ(self):
+        a = self.tmpdir / "a"
+        b = self.tmpdir / "b"
+        a.write_text("Hello, world!", "utf-8")
+        b.write_text("Hello, world!", "utf-8")
+        assert not files_differ(a, b)
+
+        b.write_text("Hello, World!", "utf-8")
+        os.utime(b, ns=(a.stat().st_atime_ns, a.stat().st_mtime_ns + 10**9))
+        assert files_differ(a, b)
+
+        b.unlink()
+        assert files_differ(a, b)
+
+    def test_files_differ_same_size_and_mtime(self):
+        a = self.tmpdir / "a"
+        b = self.tmpdir / "b"
+        a.write_text("Hello, world!", "utf-8")
+        b.write_text("Hello, World!", "utf-8")
+        os.utime(b, ns=(a.stat().st_atime_ns, a.stat().st_mtime_ns))
+        assert files_differ(a, b)
+        assert not files_differ(a, b, quick=True)
+
+    def test_glob_to_regex(self):
+        for pattern, path, expected in [
+            ("/etc/*", "/etc/a.conf", True),
+            ("/etc/*", "/etc/sub/deep.conf", False),
+            ("/etc/?", "/etc/a", True),
+            ("/etc?a", "/etc/a", False),
+            ("/etc/[ab].conf", "/etc/b.conf", True),
+            ("/etc/[!ab].conf", "/etc/c.conf", True),
+            ("/etc/[!ab].conf", "/etc/a.conf", False),
+            ("/etc[!ab]a", "/etc/a", False),
+            ("/etc/a.conf", "/etc/abconf", False),
+            ("/etc/foo[", "/etc/foo[", True),
+        ]:
+            assert bool(re.fullmatch(glob_to_regex(pattern), path)) == expected, pattern
+
+    def test_mkdir_once(self):
+        path = self.tmpdir / "a" / "b"
+        known = set()
+        mkdir_once(path, known)
+        assert path.is_dir()
+        assert known == {path}
+
+        path.rmdir()
+        mkdir_once(path, known)
+        assert not path.exists()
+
+    def test_mkdir_with_owner_group_mode(self):
+        path = self.tmpdir / "a" / "b" / "c"
+        known = set()
+        mkdir_with_owner_group_mode(path, self.user, self.group, 0o750, known)
+        assert path.is_dir()
+        assert path in known
+
+        # directories in known are not checked again
+        path.rmdir()
+        mkdir_with_owner_group_mode(path, self.user, self.group, 0o750, known)
+        assert not path.exists()
+        mkdir_with_owner_group_mode(path, self.user, self.group, 0o750)
+        assert path.is_dir()
+
     def test_mode_to_str_ug_rw(self):
         assert mode_to_str("-", 0o660) == "-rw-rw----"
 
@@ -51,3 +172,10 @@ class TestHamstercage(unittest.TestCase):
     def test_short_date_9_months_ago(self):
         t = datetime.now() + timedelta(days=-9 * 30)
         assert short_date(int(t.timestamp())) == t.strftime("%Y")
+
+    def test_short_date_given_now(self):
+        t = datetime(2020, 6, 1, 12, 34)
+        ts = int(t.timestamp())
+        assert short_date(ts, ts + 60) == "12:34"
+        assert short_date(ts, ts + 2 * 24 * 3600) == "01.06."
+        assert short_date(ts, ts - 200 * 24 * 3600) == "2020"
@@ -1,38 +1,187 @@
+import functools
+import grp
 import os
-import shutil
+import pwd
+import re
 import stat
-from typing import List, Union
+from typing import List, Optional, Union
 
 import sys
+import time
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from pathlib import Path
 
+COMPARE_BUFSIZE = 64 * 1024
+ONE_DAY = 24 * 60 * 60
+HALF_A_YEAR = 365 / 2 * ONE_DAY
+
+# whether os.chmod() can change a symlink itself
+_CHMOD_NOFOLLOW = os.chmod in os.supports_follow_symlinks
+
 
 def chmod(path, mode):
     """
-    Change access mode on a target directory entry. Do not follow symlinks if the platform supports it.
+    Change access mode on a target directory entry. Symlinks are never followed; where the platform cannot change the
+    mode of a symlink itself, symlinks are left alone.
 
     :param path: path to the file
     :param mode: mode to be set
     :return:
     """
-    if os.chmod in os.supports_follow_symlinks:
+    if _CHMOD_NOFOLLOW:
         os.chmod(path, mode, follow_symlinks=False)
-    else:
-        pass
+    elif not os.path.islink(path):
+        os.chmod(path, mode)
+
+
+def chown(path, owner: Union[str, int], group: Union[str, int]):
+    """
+    Change owner and group of a file, like shutil.chown(), but look up each user and group name only once.
+
+    :param path: path to the file
+    :param owner: name or uid of the new owner
+    :param group: name or gid of the new group
+    :return:
+    """
+    os.chown(path, _uid(owner), _gid(group))
 
 
 def ensure_last_line_ends_in_newline(lines: List[str]):
-    if len(lines) == 0:
+    if not lines:
         return
-    if len(lines[-1]) == 0:
-        lines[-1] = "\n"
-    if lines[-1][-1] != "\n":
-        lines[-1] += "\n"
+    last = lines[-1]
+    if not last.endswith("\n"):
+        lines[-1] = last + "\n"
+
+
+def files_differ(
+    a: Path,
+    b: Path,
+    a_stat: os.stat_result = None,
+    b_stat: os.stat_result = None,
+    quick: bool = False,
+) -> bool:
+    """
+    Returns true if the contents of the two files differ, or if one of them does not exist. Files of different size
+    differ, otherwise the contents are compared chunk by chunk up to the first difference.
+    :param a: path to the first file
+    :param b: path to the second file
+    :param a_stat: result of os.stat(a), if the caller already has it
+    :param b_stat: result of os.stat(b), if the caller already has it
+    :param quick: consider files with the same size and modification time identical without reading them. This can
+    miss changes that kept the mtime, so only use it where a wrong answer is merely displayed.
+    :return: True if the files differ
+    """
+    try:
+        if a_stat is None:
+            a_stat = os.stat(a)
+        if b_stat is None:
+            b_stat = os.stat(b)
+    except FileNotFoundError:
+        return True
+    if a_stat.st_size != b_stat.st_size:
+        return True
+    if quick and a_stat.st_mtime_ns == b_stat.st_mtime_ns:
+        return False
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            ca = fa.read(COMPARE_BUFSIZE)
+            if ca != fb.read(COMPARE_BUFSIZE):
+                return True
+            if not ca:
+                return False
+
+
+@functools.lru_cache(maxsize=None)
+def _gid(group: Union[str, int]) -> int:
+    if group is None:
+        return -1
+    if isinstance(group, int):
+        return group
+    try:
+        return grp.getgrnam(group).gr_gid
+    except KeyError:
+        raise LookupError(f"no such group: {group!r}")
+
+
+@functools.lru_cache(maxsize=None)
+def _uid(owner: Union[str, int]) -> int:
+    if owner is None:
+        return -1
+    if isinstance(owner, int):
+        return owner
+    try:
+        return pwd.getpwnam(owner).pw_uid
+    except KeyError:
+        raise LookupError(f"no such user: {owner!r}")
+
+
+def glob_to_regex(pattern: str) -> str:
+    """
+    Translates a shell-style pattern into a regular expression. Unlike fnmatch.translate(), the wildcards * and ? and
+    bracket expressions do not match "/", so a pattern matches path components one by one.
+    :param pattern: pattern with *, ? and [...] wildcards
+    :return: regular expression, to be used with fullmatch()
+    """
+    r = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            r.append("[^/]*")
+        elif c == "?":
+            r.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and pattern[j] == "!":
+                j += 1
+            if j < n and pattern[j] == "]":
+                j += 1
+            j = pattern.find("]", j)
+            if j < 0:
+                r.append(re.escape(c))
+                continue
+            chars = pattern[i:j]
+            i = j + 1
+            negate = chars.startswith("!")
+            if negate:
+                chars = chars[1:]
+            # keep ranges like a-z, escape anything else with a meaning inside a character class
+            chars = re.sub(r"([\\\[\]^&~|])", r"\\\1", chars)
+            r.append(f"(?!/)[{'^' if negate else ''}{chars}]")
+        else:
+            r.append(re.escape(c))
+    return "".join(r)
 
 
-def mkdir_with_owner_group_mode(path: Path, owner: str, group: str, mode: int):
+@functools.lru_cache(maxsize=None)
+def group_name(gid: int) -> str:
+    """
+    Returns the name of the group with the given gid. Each gid is only looked up once.
+    :param gid: group id
+    :return: group name
+    """
+    return grp.getgrgid(gid).gr_name
+
+
+def mkdir_once(path: Path, known: set) -> None:
+    """
+    Create the directory path, including all parents, unless it is in known. path is added to known.
+    :param path: path of directory to create
+    :param known: set of directories known to exist
+    :return: none
+    """
+    if path not in known:
+        path.mkdir(parents=True, exist_ok=True)
+        known.add(path)
+
+
+def mkdir_with_owner_group_mode(
+    path: Path, owner: str, group: str, mode: int, known: set = None
+):
     """
     Create the directory path, including all parents. The new directories will be owned and have the permissions
     as specified.
@@ -40,14 +189,22 @@ def mkdir_with_owner_group_mode(path: Path, owner: str, group: str, mode: int):
     :param owner: owner of the new directory
     :param group: group of the new directory
     :param mode: permission bits of the new directory
+    :param known: optional set of directories known to exist; it is checked instead of the file system, and updated
     :return: none
     """
-    if not path.exists():
-        if path.parent is not None:
-            mkdir_with_owner_group_mode(path.parent, owner, group, mode)
-        path.mkdir(mode=mode)
-        chmod(str(path), mode)
-        shutil.chown(str(path), owner, group)
+    if known is None:
+        known = set()
+    missing = []
+    p = path
+    while p not in known and not p.exists():
+        missing.append(p)
+        p = p.parent
+    # create top-down; mkdir(parents=True) would not apply mode to the intermediate directories
+    for p in reversed(missing):
+        p.mkdir(mode=mode, exist_ok=True)
+        chmod(str(p), mode)
+        chown(p, owner, group)
+    known.add(path)
 
 
 def mode_to_str(type: str, mode: int) -> str:
@@ -59,20 +216,32 @@ def mode_to_str(type: str, mode: int) -> str:
     return type + stat.filemode(mode)[1:]
 
 
-def short_date(ts: int) -> str:
+def short_date(ts: int, now: float = None) -> str:
     """
     Returns a short date/time string based on the epoch timestamp
     :param ts:
+    :param now: current epoch time; pass it in when formatting many timestamps
     :return:
     """
-    dt = datetime.fromtimestamp(ts)
-    delta = abs(dt - datetime.now())
+    if now is None:
+        now = time.time()
+    delta = abs(ts - now)
     f = "%Y"
-    if delta < timedelta(days=1):
+    if delta < ONE_DAY:
         f = "%H:%M"
-    elif delta < timedelta(days=365 / 2):
+    elif delta < HALF_A_YEAR:
         f = "%d.%m."
-    return dt.strftime(f)
+    return datetime.fromtimestamp(ts).strftime(f)
+
+
+@functools.lru_cache(maxsize=None)
+def owner_name(uid: int) -> str:
+    """
+    Returns the name of the user with the given uid. Each uid is only looked up once.
+    :param uid: user id
+    :return: user name
+    """
+    return pwd.getpwuid(uid).pw_name
 
 
 def path_as_child_of(path: Union[Path, str], target_path: Path) -> Path:
@@ -82,7 +251,7 @@ def path_as_child_of(path: Union[Path, str], target_path: Path) -> Path:
     :param target_path: the base path
     :return: path
     """
-    path = str(path)
+    path = os.fspath(path)
     if path.startswith("/"):
         path = path[1:]
     return target_path / path
@@ -101,9 +270,7 @@ def print_table(table: list, align=None, file=None, tabs=None) -> None:
         file = sys.stdout
     if tabs is None:
         tabs = not file.isatty()
-    cols = 0
-    for line in table:
-        cols = max(cols, len(line))
+    cols = max(map(len, table), default=0)
     if tabs:
         f = "\t".join(["{}"] * cols)
     else:
@@ -111,8 +278,8 @@ def print_table(table: list, align=None, file=None, tabs=None) -> None:
         if len(align) < cols:
             align.extend(["<"] * (cols - len(align)))
         for line in table:
-            for i in range(0, len(line)):
-                widths[i] = max(widths[i], len(line[i]))
+            for i, cell in enumerate(line):
+                widths[i] = max(widths[i], len(cell))
         fs = []
         for i in range(0, len(widths) - 1):
             fs.append(f"{{{i}:{align[i]}{widths[i]}}}")
@@ -124,9 +291,25 @@ def print_table(table: list, align=None, file=None, tabs=None) -> None:
         print(f.format(*line), file=file)
 
 
+def stat_or_none(path, follow_symlinks=True) -> Optional[os.stat_result]:
+    """
+    Returns the result of stat() for path, or None if it does not exist.
+    :param path: path to the file
+    :param follow_symlinks: if False, stat the symlink itself instead of its target
+    :return: stat result or None
+    """
+    try:
+        return os.stat(path, follow_symlinks=follow_symlinks)
+    except FileNotFoundError:
+        return None
+
+
 class ListEntry:
+    __slots__ = ("entry", "repo", "tag", "target")
+
     # noinspection PyUnresolvedReferences
-    def __init__(self, entry: "Entry", repo: Path, tag: str):
+    def __init__(self, entry: "Entry", repo: Path, tag: str, target: Path = None):
         self.entry = entry
         self.repo = repo
         self.tag = tag
+        self.target = target